@@ -10,7 +10,7 @@ from fastapi.responses import JSONResponse
 
 from ..config import load_config, AppConfig
 from ..core.models import ChatCompletionsRequest
-from .deps import set_config, initialize_storage, ConfigDep, TEIDep
+from .deps import set_config, initialize_storage, shutdown_storage, ConfigDep, TEIDep
 from ..storage.vllm_client import VLLMClient
 
 
@@ -40,6 +40,10 @@ def create_app(cfg: AppConfig) -> FastAPI:
         await initialize_storage()
         logging.info("RAG Gateway initialized")
 
+    @app.on_event("shutdown")
+    async def _shutdown():
+        await shutdown_storage()
+
     @app.get("/health")
     async def health():
         return {"ok": True}
@@ -38,6 +38,7 @@ async def initialize_storage() -> None:
         rerank_base_url=_config.upstreams.tei_rerank_url,
         embed_model=_config.models.embed_model,
         rerank_model=_config.models.rerank_model,
+        max_connections=_config.upstreams.tei_max_connections,
     )
     _vllm = VLLMClient(_config.upstreams.vllm_url)
 
@@ -49,9 +50,8 @@ async def initialize_storage() -> None:
         collection="chunks_v1",
         vector_size=vector_size,
     )
-    _qdrant.ensure_collection()
+    await _qdrant.ensure_collection()
 
-    from ..core.retrieval import RetrievalDeps
     _retrieval = RetrievalService(
         bm25=_bm25,
         qdrant=_qdrant,
@@ -60,6 +60,15 @@ async def initialize_storage() -> None:
     )
 
 
+async def shutdown_storage() -> None:
+    if _tei is not None:
+        await _tei.aclose()
+    if _vllm is not None:
+        await _vllm.aclose()
+    if _qdrant is not None:
+        await _qdrant.close()
+
+
 async def get_config() -> AppConfig:
     if _config is None:
         raise RuntimeError("Config not loaded")
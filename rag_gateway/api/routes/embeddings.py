@@ -33,15 +33,19 @@ async def embeddings(
         vectors = await tei.embed_many([inp])
         return {
             "object": "list",
-            "data": [{"object": "embedding", "index": 0, "embedding": vectors[0]}],
+            "data": [{"object": "embedding", "index": 0, "embedding": vectors[0].tolist()}],
             "model": model,
         }
 
     if isinstance(inp, list):
-        vectors = await tei.embed_many([str(x) for x in inp])
+        vectors = await tei.embed_many_batched(
+            [str(x) for x in inp],
+            batch_size=cfg.upstreams.tei_embed_batch_size,
+            max_concurrency=cfg.upstreams.tei_embed_concurrency,
+        )
         return {
             "object": "list",
-            "data": [{"object": "embedding", "index": i, "embedding": v} for i, v in enumerate(vectors)],
+            "data": [{"object": "embedding", "index": i, "embedding": v} for i, v in enumerate(vectors.tolist())],
             "model": model,
         }
 
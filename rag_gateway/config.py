@@ -27,6 +27,9 @@ class Upstreams:
     tei_embed_url: str
     tei_rerank_url: str
     vllm_url: str
+    tei_embed_batch_size: int = 32
+    tei_embed_concurrency: int = 4
+    tei_max_connections: int = 32
 
 
 @dataclass(frozen=True)
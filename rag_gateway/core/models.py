@@ -88,7 +88,7 @@ class IngestRequest(BaseModel):
     dry_run: Optional[bool] = False
 
 
-@dataclass
+@dataclass(slots=True)
 class ChunkRecord:
     chunk_id: str
     chunk_hash: str
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import asyncio
-import re
+import functools
+import heapq
 import time
 import logging
 import psutil
+from collections import defaultdict
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -15,11 +17,20 @@ from ..storage.tei_client import TEIClient
 
 
 
+@functools.lru_cache(maxsize=32)
+def _rrf_weights(k: int, n: int) -> Tuple[float, ...]:
+    return tuple(1.0 / (k + rank) for rank in range(1, n + 1))
+
+
 def rrf_fuse(ranked_lists: List[List[str]], k: int = 60) -> Dict[str, float]:
-    scores: Dict[str, float] = {}
+    # 1/(k + rank) is precomputed per k (in steps of 256 ranks) and shared by
+    # all lists, so the loop is a single defaultdict add per hit.
+    longest = max((len(lst) for lst in ranked_lists), default=0)
+    weights = _rrf_weights(k, -(-longest // 256) * 256)
+    scores: Dict[str, float] = defaultdict(float)
     for lst in ranked_lists:
-        for rank, doc_id in enumerate(lst, start=1):
-            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+        for doc_id, w in zip(lst, weights):
+            scores[doc_id] += w
     return scores
 
 
@@ -64,13 +75,15 @@ class RetrievalDeps:
     tei: TEIClient
 
 
-def _safe_extract(payload_or_stored: Any, key: str) -> str:
-    if isinstance(payload_or_stored, dict):
-        val = payload_or_stored.get(key)
-        if isinstance(val, str):
-            return val
-    elif isinstance(payload_or_stored, list) and len(payload_or_stored) > 0:
-        return str(payload_or_stored[0])
+def _pick(payload: Dict[str, Any], stored: Dict[str, Any], key: str) -> str:
+    # Qdrant payload values are plain strings; Tantivy stored fields come
+    # back as single-element lists.
+    val = payload.get(key)
+    if val and isinstance(val, str):
+        return val
+    vals = stored.get(key)
+    if isinstance(vals, list) and vals:
+        return str(vals[0])
     return ""
 
 
@@ -104,26 +117,34 @@ async def retrieve_evidence(
 ) -> RetrievalResult:
     logger = logging.getLogger(__name__)
 
-    bm25_start = time.time()
-    bm25_hits = deps.bm25.search(query, top_n=bm25_top_n)
-    bm25_time = time.time() - bm25_start
+    # BM25 and embed -> vector search are independent, so they run
+    # concurrently; the blocking Tantivy searcher is moved to a thread.
+    async def _bm25_search():
+        bm25_start = time.time()
+        hits = await asyncio.to_thread(deps.bm25.search, query, top_n=bm25_top_n)
+        bm25_time = time.time() - bm25_start
+        logger.info(f"BM25: {len(hits)} hits in {bm25_time:.2f}s | MEM: {int(psutil.Process().memory_info().rss / 1024 / 1024)}MB")
+        return hits
+
+    async def _vec_search():
+        embed_start = time.time()
+        qvec = await deps.tei.embed_one(query)  # Use original query for embedding semantics
+        embed_time = time.time() - embed_start
+        logger.info(f"EMBED: query embedded in {embed_time:.2f}s | MEM: {int(psutil.Process().memory_info().rss / 1024 / 1024)}MB")
+
+        vec_start = time.time()
+        hits = await deps.vec.search(vector=qvec, top_n=vec_top_n, filters=qdrant_filters)
+        vec_time = time.time() - vec_start
+        logger.info(f"VECTOR: {len(hits)} hits in {vec_time:.2f}s | MEM: {int(psutil.Process().memory_info().rss / 1024 / 1024)}MB")
+        return hits
+
+    bm25_hits, vec_hits = await asyncio.gather(_bm25_search(), _vec_search())
     bm25_rank = [h.chunk_id for h in bm25_hits if h.chunk_id]
-    logger.info(f"BM25: {len(bm25_hits)} hits in {bm25_time:.2f}s | MEM: {int(psutil.Process().memory_info().rss / 1024 / 1024)}MB")
-
-    embed_start = time.time()
-    qvec = await deps.tei.embed_one(query)  # Use original query for embedding semantics
-    embed_time = time.time() - embed_start
-    logger.info(f"EMBED: query embedded in {embed_time:.2f}s | MEM: {int(psutil.Process().memory_info().rss / 1024 / 1024)}MB")
-
-    vec_start = time.time()
-    vec_hits = deps.vec.search(vector=qvec, top_n=vec_top_n, filters=qdrant_filters)
-    vec_time = time.time() - vec_start
     vec_rank = [h.chunk_id for h in vec_hits if h.chunk_id]
-    logger.info(f"VECTOR: {len(vec_hits)} hits in {vec_time:.2f}s | MEM: {int(psutil.Process().memory_info().rss / 1024 / 1024)}MB")
 
     rrf_start = time.time()
     fused = rrf_fuse([bm25_rank, vec_rank], k=rrf_k)
-    candidates = sorted(fused.items(), key=lambda x: x[1], reverse=True)[:rerank_top_k]
+    candidates = heapq.nlargest(rerank_top_k, fused.items(), key=lambda x: x[1])
     rrf_time = time.time() - rrf_start
     logger.info(f"RRF: {len(candidates)} candidates in {rrf_time:.2f}s | MEM: {int(psutil.Process().memory_info().rss / 1024 / 1024)}MB")
 
@@ -132,56 +153,38 @@ async def retrieve_evidence(
 
     cand_chunks: List[EvidenceChunk] = []
     for chunk_id, fused_score in candidates:
-        payload = payload_by_id.get(chunk_id, {})
-        stored = stored_by_id.get(chunk_id, {})
-
-        text = payload.get("text") or ""
-        title = _safe_extract(payload, "title") or _safe_extract(stored, "title")
-        source = _safe_extract(payload, "source") or _safe_extract(stored, "source")
-        url_or_path = _safe_extract(payload, "url_or_path") or _safe_extract(stored, "url_or_path")
+        payload = payload_by_id.get(chunk_id) or {}
+        stored = stored_by_id.get(chunk_id) or {}
 
         cand_chunks.append(
             EvidenceChunk(
                 chunk_id=chunk_id,
-                title=title,
-                source=source,
-                url_or_path=url_or_path,
+                title=_pick(payload, stored, "title"),
+                source=_pick(payload, stored, "source"),
+                url_or_path=_pick(payload, stored, "url_or_path"),
                 vendor=payload.get("vendor"),
                 product=payload.get("product"),
                 version=payload.get("version"),
-                text=text,
+                text=payload.get("text") or "",
                 score=float(fused_score),
             )
         )
 
+    if len(cand_chunks) <= evidence_top_k:
+        # Nothing to prune, so skip the rerank round trip
+        return RetrievalResult(evidence=cand_chunks)
+
     texts = [c.text[:1000] for c in cand_chunks]
-    batch_size = 10
     rerank_start = time.time()
-    if len(texts) <= batch_size:
-        rerank_json = await deps.tei.rerank(query=query, texts=texts)
-        rerank_time = time.time() - rerank_start
-        logger.info(f"RERANK_SINGLE: {len(texts)} texts in {rerank_time:.2f}s | MEM: {int(psutil.Process().memory_info().rss / 1024 / 1024)}MB")
-    else:
-        batches = [texts[i:i+batch_size] for i in range(0, len(texts), batch_size)]
-        rerank_jsons = await asyncio.gather(*[deps.tei.rerank(query=query, texts=batch) for batch in batches])
-        combined_results = []
-        for batch_idx, rj in enumerate(rerank_jsons):
-            start_idx = batch_idx * batch_size
-            # Handle both dict (with "results" key) and list responses from TEI
-            if isinstance(rj, list):
-                results = rj
-            else:
-                results = rj.get("results", [])
-            for item in results:
-                item["index"] += start_idx
-                combined_results.append(item)
-        rerank_json = {"results": combined_results}
+    rerank_json = await deps.tei.rerank(query=query, texts=texts, batch_size=10)
+    rerank_time = time.time() - rerank_start
+    logger.info(f"RERANK: {len(texts)} texts in {rerank_time:.2f}s | MEM: {int(psutil.Process().memory_info().rss / 1024 / 1024)}MB")
     pairs = _normalize_rerank(rerank_json, n=len(cand_chunks))
 
     if not pairs:
-        top = sorted(cand_chunks, key=lambda c: c.score, reverse=True)[:evidence_top_k]
+        top = heapq.nlargest(evidence_top_k, cand_chunks, key=lambda c: c.score)
         return RetrievalResult(evidence=top)
 
-    reranked = sorted([(cand_chunks[i], s) for i, s in pairs], key=lambda x: x[1], reverse=True)
-    top = [c for c, _ in reranked[:evidence_top_k]]
+    reranked = heapq.nlargest(evidence_top_k, pairs, key=lambda p: p[1])
+    top = [cand_chunks[i] for i, _ in reranked]
     return RetrievalResult(evidence=top)
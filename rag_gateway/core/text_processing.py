@@ -1,25 +1,48 @@
 from __future__ import annotations
 
+import functools
 import logging
 import re
-from typing import Iterable
+from typing import Any, Iterable, Optional, Union
 
 from bs4 import BeautifulSoup
 
+try:
+    import re2
+except ImportError:  # optional linear-time regex engine, re is used otherwise
+    re2 = None
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_redaction_pattern(pat: str) -> Optional[Any]:
+    # Patterns come from config and repeat on every request, so each one is
+    # compiled (and an invalid one reported) only once per process.
+    if re2 is not None:
+        # RE2 scans in linear time (no catastrophic backtracking on user
+        # input); patterns it can't express, e.g. backreferences, use re.
+        try:
+            return re2.compile(pat)
+        except Exception:
+            pass
+    try:
+        return re.compile(pat)
+    except re.error as e:
+        logging.warning(f"Invalid redaction pattern '{pat}': {e}")
+        return None
+
+
+def _redaction_sub(m: Any) -> str:
+    if m.lastindex and m.lastindex >= 2:
+        return f"{m.group(1)}<REDACTED>"
+    return "<REDACTED>"
+
 
 def redact_text(text: str, patterns: Iterable[str]) -> str:
     redacted = text
     for pat in patterns:
-        try:
-            rx = re.compile(pat)
-            def _sub(m: re.Match) -> str:
-                if m.lastindex and m.lastindex >= 2:
-                    return f"{m.group(1)}<REDACTED>"
-                return "<REDACTED>"
-            redacted = rx.sub(_sub, redacted)
-        except re.error as e:
-            logging.warning(f"Invalid redaction pattern '{pat}': {e}")
-            continue
+        rx = _compile_redaction_pattern(pat)
+        if rx is not None:
+            redacted = rx.sub(_redaction_sub, redacted)
     return redacted
 
 
@@ -32,11 +55,16 @@ def normalize_whitespace(s: str) -> str:
     return s.strip()
 
 
-def html_to_text(html: str) -> str:
-    if not html or not isinstance(html, str):
+def parse_html(html: str) -> BeautifulSoup:
+    return BeautifulSoup(html, "lxml")
+
+
+def html_to_text(html: Union[str, BeautifulSoup]) -> str:
+    """Convert HTML to text. An already parsed tree is reused and modified in place."""
+    if not isinstance(html, BeautifulSoup) and (not html or not isinstance(html, str)):
         return ""
     try:
-        soup = BeautifulSoup(html, "lxml")
+        soup = html if isinstance(html, BeautifulSoup) else parse_html(html)
         for tag in soup(["script", "style", "noscript", "header", "footer", "nav"]):
             tag.decompose()
         for pre in soup.find_all(["pre", "code"]):
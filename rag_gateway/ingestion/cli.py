@@ -31,6 +31,7 @@ Usage:
 
 import argparse
 import asyncio
+import functools
 import json
 import logging
 import os
@@ -47,7 +48,17 @@ from ..storage.qdrant_store import QdrantVectorStore
 from ..storage.tantivy_index import TantivyBM25
 from ..storage.tei_client import TEIClient
 from ..ingestion.service import ingest_documents, crawl_sources
-from ..ingestion.pipeline import document_to_chunks
+from ..ingestion.pipeline import count_chunks
+from ..ingestion.crawlers.http_crawler import DomainRateLimiter, create_client as create_http_client
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# libyaml's C loader when PyYAML was built with it
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 
 _SHUTDOWN_REQUESTED = False
@@ -272,10 +283,9 @@ async def run_crawl(
 ) -> Dict[str, Any]:
     global _SHUTDOWN_REQUESTED, _FORCE_SHUTDOWN
 
-    import yaml
-    ingest_cfg = yaml.safe_load(Path(ingest_config_path).read_text(encoding="utf-8")) or {}
+    ingest_cfg = _read_yaml(ingest_config_path)
 
-    sources_doc = yaml.safe_load(Path(sources_path).read_text(encoding="utf-8")) or {}
+    sources_doc = _read_yaml(sources_path)
     defaults = sources_doc.get("defaults", {})
     all_sources = sources_doc.get("sources", [])
 
@@ -294,16 +304,27 @@ async def run_crawl(
 
     var_dir = str(Path(api_cfg.paths.tantivy_index_dir).parent)
     lock_file = os.path.join(var_dir, "crawl.lock")
+    state_file = os.path.join(var_dir, "last_run.json")
     lock_fd = _acquire_lock(str(lock_file))
     logger.info(f"Acquired lock: {lock_file}")
 
+    tei: Optional[TEIClient] = None
+    qdrant: Optional[QdrantVectorStore] = None
+    http_user_agent = ingest_cfg.get("http", {}).get("user_agent", "rag-gateway/0.1")
+    # One HTTP/2 pool for the whole run, so every source and spec crawling
+    # the same host reuses its keep-alive connections and TLS sessions.
+    http_client = create_http_client(http_user_agent)
     try:
-        bm25 = TantivyBM25(api_cfg.paths.tantivy_index_dir)
+        bm25 = TantivyBM25(
+            api_cfg.paths.tantivy_index_dir,
+            writer_heap_bytes=int(ingest_cfg.get("tantivy", {}).get("writer_heap_mb", 512)) * 1_000_000,
+        )
         tei = TEIClient(
             embed_base_url=api_cfg.upstreams.tei_embed_url,
             rerank_base_url=api_cfg.upstreams.tei_rerank_url,
             embed_model=api_cfg.models.embed_model,
             rerank_model=api_cfg.models.rerank_model,
+            max_connections=ingest_cfg.get("tei", {}).get("max_connections", 8),
         )
         logger.info("Probing TEI for vector dimensions...")
         probe = await tei.embed_one("dimension_probe")
@@ -315,143 +336,197 @@ async def run_crawl(
             collection=ingest_cfg.get("qdrant_collection", "chunks_v1"),
             vector_size=vector_size,
         )
-        qdrant.ensure_collection()
+        await qdrant.ensure_collection()
         logger.info(f"Qdrant collection ready: {qdrant.collection}")
 
         totals = {"sources": 0, "documents": 0, "chunks": 0, "points": 0, "skipped": 0, "updated": 0}
         errors: List[Dict[str, Any]] = []
-        per_source: List[Dict[str, Any]] = []
-
-        for idx, src in enumerate(sources, 1):
-            src_name = src.get("name", f"unnamed_{idx}")
-            logger.info(f"[{idx}/{len(sources)}] Processing source: {src_name}")
-
-            if not src.get("enabled", defaults.get("enabled", True)):
-                logger.info(f"  Source {src_name} is disabled, skipping")
-                continue
-
-            http_enabled = src.get("http_enabled", defaults.get("http_enabled", True))
-            github_enabled = src.get("github_enabled", defaults.get("github_enabled", True))
-
-            if _SHUTDOWN_REQUESTED:
-                logger.warning("Shutdown requested, stopping after current source")
-                break
-
-            # Check for forced shutdown
-            if _FORCE_SHUTDOWN:
-                logger.error("Forced shutdown - exiting immediately")
-                sys.exit(128 + signal.SIGINT)
-
-            try:
-                src_tags = _parse_tags(src, defaults)
-                src_dry = src.get("dry_run", defaults.get("dry_run", dry_run))
-                if dry_run:
-                    src_dry = True
-
-                http_specs = _parse_http_specs(src) if http_enabled else []
-                gh_specs = _parse_github_specs(src) if github_enabled else []
 
-                if not http_specs and not gh_specs:
-                    logger.info(f"  No enabled crawlers for {src_name}, skipping")
-                    continue
-
-                logger.info(f"  Crawling {len(http_specs)} HTTP specs, {len(gh_specs)} GitHub specs...")
-
-                # Check for forced shutdown before starting async operations
+        # Sources are crawled concurrently (bounded by max_concurrent_sources),
+        # sharing one per-host rate limiter so politeness holds across them.
+        # Tantivy allows a single index writer, so ingestion is serialized.
+        source_slots = asyncio.Semaphore(max(1, int(ingest_cfg.get("max_concurrent_sources", 4))))
+        ingest_lock = asyncio.Lock()
+        rate_limiter = DomainRateLimiter(
+            ingest_cfg.get("http", {}).get("politeness_delay_s", 0.2),
+            max_crawl_delay_s=ingest_cfg.get("http", {}).get("max_crawl_delay_s", 30.0),
+        )
+        per_source_slots: List[List[Dict[str, Any]]] = [[] for _ in sources]
+
+        # Checkpointed as each source finishes ingesting, so a run that is
+        # interrupted or fails still records the sources it completed
+        state = _load_last_run(state_file) or {}
+        state.setdefault("per_source_last_ts", {})
+        state_lock = asyncio.Lock()
+
+        async def checkpoint_source(src_name: str) -> None:
+            async with state_lock:
+                state["per_source_last_ts"][src_name] = time.time()
+                snapshot = {**state, "per_source_last_ts": dict(state["per_source_last_ts"])}
+                try:
+                    await asyncio.to_thread(_save_last_run, state_file, snapshot)
+                except OSError as e:
+                    logger.warning(f"  Failed to checkpoint {src_name} in {state_file}: {e}")
+
+        async def process_source(idx: int, src: Dict[str, Any]) -> None:
+            per_source = per_source_slots[idx - 1]
+            async with source_slots:
+                src_name = src.get("name", f"unnamed_{idx}")
+                logger.info(f"[{idx}/{len(sources)}] Processing source: {src_name}")
+
+                if not src.get("enabled", defaults.get("enabled", True)):
+                    logger.info(f"  Source {src_name} is disabled, skipping")
+                    return
+
+                http_enabled = src.get("http_enabled", defaults.get("http_enabled", True))
+                github_enabled = src.get("github_enabled", defaults.get("github_enabled", True))
+
+                if _SHUTDOWN_REQUESTED:
+                    logger.warning(f"Shutdown requested, skipping source {src_name}")
+                    return
+
+                # Check for forced shutdown
                 if _FORCE_SHUTDOWN:
-                    logger.error("Forced shutdown - cancelling async operations")
-                    break
-
-                docs = await crawl_sources(
-                    http_specs=http_specs,
-                    github_specs=gh_specs,
-                    http_user_agent=ingest_cfg.get("http", {}).get("user_agent", "rag-gateway/0.1"),
-                    http_max_pages=ingest_cfg.get("http", {}).get("max_pages", 2000),
-                    http_max_depth=ingest_cfg.get("http", {}).get("max_depth", 4),
-                    http_timeout_s=ingest_cfg.get("http", {}).get("request_timeout_s", 30),
-                    http_delay_s=ingest_cfg.get("http", {}).get("politeness_delay_s", 0.2),
-                    http_max_concurrent=ingest_cfg.get("http", {}).get("max_concurrent", 8),
-                    github_max_files=ingest_cfg.get("github", {}).get("max_files", 5000),
-                    github_max_file_size_bytes=ingest_cfg.get("github", {}).get("max_file_size_bytes", 2000000),
-                )
-                logger.info(f"  Crawled {len(docs)} documents")
-
-                for d in docs:
-                    d.vendor = d.vendor or src_tags.get("vendor")
-                    d.product = d.product or src_tags.get("product")
-                    d.version = d.version or src_tags.get("version")
-                    d.source_type = d.source_type or (src_tags.get("source_type") or d.source_type)
-
-                if src_dry:
-                    chunk_count = 0
+                    logger.error("Forced shutdown - exiting immediately")
+                    sys.exit(128 + signal.SIGINT)
+
+                try:
+                    src_tags = _parse_tags(src, defaults)
+                    src_dry = src.get("dry_run", defaults.get("dry_run", dry_run))
+                    if dry_run:
+                        src_dry = True
+
+                    http_specs = _parse_http_specs(src) if http_enabled else []
+                    gh_specs = _parse_github_specs(src) if github_enabled else []
+
+                    if not http_specs and not gh_specs:
+                        logger.info(f"  No enabled crawlers for {src_name}, skipping")
+                        return
+
+                    logger.info(f"  Crawling {len(http_specs)} HTTP specs, {len(gh_specs)} GitHub specs...")
+
+                    # Check for forced shutdown before starting async operations
+                    if _FORCE_SHUTDOWN:
+                        logger.error("Forced shutdown - cancelling async operations")
+                        return
+
+                    docs = await crawl_sources(
+                        http_specs=http_specs,
+                        github_specs=gh_specs,
+                        http_user_agent=http_user_agent,
+                        http_max_pages=ingest_cfg.get("http", {}).get("max_pages", 2000),
+                        http_max_depth=ingest_cfg.get("http", {}).get("max_depth", 4),
+                        http_timeout_s=ingest_cfg.get("http", {}).get("request_timeout_s", 30),
+                        http_delay_s=ingest_cfg.get("http", {}).get("politeness_delay_s", 0.2),
+                        http_max_concurrent=ingest_cfg.get("http", {}).get("max_concurrent", 8),
+                        github_max_files=ingest_cfg.get("github", {}).get("max_files", 5000),
+                        github_max_file_size_bytes=ingest_cfg.get("github", {}).get("max_file_size_bytes", 2000000),
+                        http_cache_dir=ingest_cfg.get("http", {}).get("cache_dir"),
+                        rate_limiter=rate_limiter,
+                        http_client=http_client,
+                    )
+                    logger.info(f"  Crawled {len(docs)} documents")
+
                     for d in docs:
-                        chunk_count += len(
-                            document_to_chunks(
-                                doc=d,
-                                default_vendor=src_tags.get("vendor"),
-                                default_product=src_tags.get("product"),
-                                default_version=src_tags.get("version"),
-                                default_source_type=src_tags.get("source_type"),
-                                max_chars=ingest_cfg.get("chunking", {}).get("max_chars", 8000),
-                                overlap_chars=ingest_cfg.get("chunking", {}).get("overlap_chars", 800),
+                        d.vendor = d.vendor or src_tags.get("vendor")
+                        d.product = d.product or src_tags.get("product")
+                        d.version = d.version or src_tags.get("version")
+                        d.source_type = d.source_type or (src_tags.get("source_type") or d.source_type)
+
+                    if src_dry:
+                        chunking = ingest_cfg.get("chunking", {})
+                        chunk_count = sum(
+                            count_chunks(
+                                d,
+                                max_chars=chunking.get("max_chars", 8000),
+                                overlap_chars=chunking.get("overlap_chars", 800),
                             )
+                            for d in docs
                         )
-                    preview = [d.url_or_path for d in docs[:ingest_cfg.get("preview_items", 10)]]
+                        preview = [d.url_or_path for d in docs[:ingest_cfg.get("preview_items", 10)]]
+                        per_source.append({
+                            "name": src_name,
+                            "dry_run": True,
+                            "documents": len(docs),
+                            "chunks": chunk_count,
+                            "preview": preview,
+                        })
+                        logger.info(f"  Dry run: {len(docs)} docs, {chunk_count} chunks")
+                        totals["sources"] += 1
+                        totals["documents"] += len(docs)
+                        totals["chunks"] += chunk_count
+                        return
+
+                    logger.info(f"  Ingesting {len(docs)} documents...")
+                    # Get TEI configuration for embedding
+                    tei_config = ingest_cfg.get("tei", {})
+
+                    async with ingest_lock:
+                        res = await ingest_documents(
+                            documents=docs,
+                            tei=tei,
+                            bm25=bm25,
+                            qdrant=qdrant,
+                            default_vendor=src_tags.get("vendor"),
+                            default_product=src_tags.get("product"),
+                            default_version=src_tags.get("version"),
+                            default_source_type=src_tags.get("source_type"),
+                            max_chars=ingest_cfg.get("chunking", {}).get("max_chars", 8000),
+                            overlap_chars=ingest_cfg.get("chunking", {}).get("overlap_chars", 800),
+                            batch_size=ingest_cfg.get("batch_size", 64),
+                            incremental=ingest_cfg.get("incremental", True),
+                            skip_unchanged=ingest_cfg.get("skip_unchanged", True),
+                            dry_run=False,
+                            embed_batch_size=tei_config.get("embed_batch_size", 10),
+                            embed_max_concurrent=tei_config.get("embed_max_concurrent", 4),
+                            embed_config=tei_config,
+                            id_hash=ingest_cfg.get("id_hash", "sha256"),
+                            embed_workers=tei_config.get("embed_workers", 2),
+                            keep_bm25_writer=True,
+                        )
+                    per_source.append({"name": src_name, "dry_run": False, **res})
+                    logger.info(f"  Ingested: {res['chunks']} chunks, {res['updated']} updated, {res['skipped']} skipped")
+
+                    totals["sources"] += 1
+                    for k in ["documents", "chunks", "points", "skipped", "updated"]:
+                        totals[k] += int(res.get(k, 0))
+                    await checkpoint_source(src_name)
+
+                except Exception as e:
+                    logger.error(f"  Error processing source {src_name}: {e}", exc_info=True)
+                    errors.append({
+                        "source": src_name,
+                        "error": str(e),
+                        "type": type(e).__name__,
+                    })
                     per_source.append({
                         "name": src_name,
-                        "dry_run": True,
-                        "documents": len(docs),
-                        "chunks": chunk_count,
-                        "preview": preview,
+                        "error": str(e),
+                        "type": type(e).__name__,
                     })
-                    logger.info(f"  Dry run: {len(docs)} docs, {chunk_count} chunks")
-                    totals["sources"] += 1
-                    totals["documents"] += len(docs)
-                    totals["chunks"] += chunk_count
-                    continue
-
-                logger.info(f"  Ingesting {len(docs)} documents...")
-                # Get TEI configuration for embedding
-                tei_config = ingest_cfg.get("tei", {})
-
-                res = await ingest_documents(
-                    documents=docs,
-                    tei=tei,
-                    bm25=bm25,
-                    qdrant=qdrant,
-                    default_vendor=src_tags.get("vendor"),
-                    default_product=src_tags.get("product"),
-                    default_version=src_tags.get("version"),
-                    default_source_type=src_tags.get("source_type"),
-                    max_chars=ingest_cfg.get("chunking", {}).get("max_chars", 8000),
-                    overlap_chars=ingest_cfg.get("chunking", {}).get("overlap_chars", 800),
-                    batch_size=ingest_cfg.get("batch_size", 64),
-                    incremental=ingest_cfg.get("incremental", True),
-                    skip_unchanged=ingest_cfg.get("skip_unchanged", True),
-                    dry_run=False,
-                    embed_batch_size=tei_config.get("embed_batch_size", 10),
-                    embed_max_concurrent=tei_config.get("embed_max_concurrent", 4),
-                    embed_config=tei_config,
-                )
-                per_source.append({"name": src_name, "dry_run": False, **res})
-                logger.info(f"  Ingested: {res['chunks']} chunks, {res['updated']} updated, {res['skipped']} skipped")
-
-                totals["sources"] += 1
-                for k in ["documents", "chunks", "points", "skipped", "updated"]:
-                    totals[k] += int(res.get(k, 0))
 
+        # Each source commits its BM25 documents into one shared Tantivy
+        # writer; it is closed (merges awaited) once, after the last source.
+        sources_failed = False
+        try:
+            await asyncio.gather(*(process_source(idx, src) for idx, src in enumerate(sources, 1)))
+        except BaseException:
+            sources_failed = True
+            raise
+        finally:
+            try:
+                await asyncio.to_thread(bm25.flush)
             except Exception as e:
-                logger.error(f"  Error processing source {src_name}: {e}", exc_info=True)
-                errors.append({
-                    "source": src_name,
-                    "error": str(e),
-                    "type": type(e).__name__,
-                })
-                per_source.append({
-                    "name": src_name,
-                    "error": str(e),
-                    "type": type(e).__name__,
-                })
+                if not sources_failed:
+                    raise
+                logger.error(f"Tantivy flush failed while aborting the run: {e}")
+        per_source = [entry for entries in per_source_slots for entry in entries]
+
+        if not dry_run:
+            # last_run_ts marks the last run that went through every source
+            async with state_lock:
+                state["last_run_ts"] = time.time()
+                _save_last_run(state_file, state)
 
         result = {"ran": True, **totals, "per_source": per_source}
         if errors:
@@ -462,45 +537,77 @@ async def run_crawl(
         return result
 
     finally:
-        _release_lock(lock_fd, str(lock_file))
+        if tei is not None:
+            await tei.aclose()
+        if qdrant is not None:
+            await qdrant.close()
+        await http_client.aclose()
+        _release_lock(lock_fd)
         logger.info("Released lock")
 
 
-def _acquire_lock(lock_file: str) -> int:
-    p = Path(lock_file)
-    p.parent.mkdir(parents=True, exist_ok=True)
+@functools.lru_cache(maxsize=16)
+def _parse_yaml_file(path: str, mtime_ns: int) -> Dict[str, Any]:
+    return yaml.load(Path(path).read_text(encoding="utf-8"), Loader=_YamlLoader) or {}
+
+
+def _read_yaml(path: str) -> Dict[str, Any]:
+    """
+    Parse a YAML config file, reusing the previous result while its mtime is
+    unchanged. The returned dict is shared between calls; do not mutate it.
+    """
+    return _parse_yaml_file(path, os.stat(path).st_mtime_ns)
+
+
+def _load_last_run(state_file: str) -> Optional[Dict[str, Any]]:
     try:
-        fd = os.open(str(p), os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o644)
-        os.write(fd, str(os.getpid()).encode("utf-8"))
-        return fd
-    except FileExistsError:
-        try:
-            existing_pid = p.read_text().strip()
-            if existing_pid and _is_process_running(int(existing_pid)):
-                raise RuntimeError(f"Lock already held by process {existing_pid}: {lock_file}")
-            else:
-                os.unlink(p)
-                return _acquire_lock(lock_file)
-        except Exception:
-            raise RuntimeError(f"Lock already held: {lock_file}")
+        return json.loads(Path(state_file).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _save_last_run(state_file: str, state: Dict[str, Any]) -> None:
+    # Write-fsync-rename so a crash leaves either the old or the new state,
+    # never a truncated file
+    p = Path(state_file)
+    tmp = p.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps(state, indent=2))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, p)
 
 
-def _release_lock(fd: int, lock_file: str) -> None:
+def _acquire_lock(lock_file: str) -> int:
+    # Advisory lock held on the open fd: the kernel drops it when the process
+    # exits, even on SIGKILL, so a stale lock file never blocks the next run.
+    p = Path(lock_file)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(p), os.O_CREAT | os.O_RDWR | getattr(os, "O_CLOEXEC", 0), 0o644)
     try:
-        os.close(fd)
-    finally:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        holder = ""
         try:
-            os.unlink(lock_file)
-        except FileNotFoundError:
+            os.lseek(fd, 0, os.SEEK_SET)
+            holder = os.read(fd, 32).decode("utf-8", errors="ignore").strip()
+        except OSError:
             pass
+        os.close(fd)
+        if holder:
+            raise RuntimeError(f"Lock already held by process {holder}: {lock_file}")
+        raise RuntimeError(f"Lock already held: {lock_file}")
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode("utf-8"))
+    return fd
 
 
-def _is_process_running(pid: int) -> bool:
-    try:
-        os.kill(pid, 0)
-        return True
-    except (OSError, ProcessLookupError):
-        return False
+def _release_lock(fd: int) -> None:
+    # Closing the fd releases the lock; the file itself is left in place
+    os.close(fd)
 
 
 def _parse_tags(src: Dict, defaults: Dict) -> Dict[str, Optional[str]]:
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedPage:
+    url: str
+    text: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class HTTPPageCache:
+    """
+    On-disk cache of fetched pages keyed by URL.
+
+    Only responses carrying an ETag or Last-Modified validator are stored, so
+    every reuse is revalidated with the origin server (If-None-Match /
+    If-Modified-Since) and a 304 turns a re-crawl into a local file read.
+    Methods do blocking file I/O; call them via asyncio.to_thread.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, url: str) -> Path:
+        key = hashlib.sha256(url.encode("utf-8", errors="ignore")).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        p = self._path(url)
+        try:
+            raw = json.loads(p.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable cache entry for {url}: {e}")
+            return None
+        if raw.get("url") != url:
+            return None
+        return CachedPage(
+            url=url,
+            text=raw.get("text") or "",
+            etag=raw.get("etag"),
+            last_modified=raw.get("last_modified"),
+        )
+
+    def put(self, url: str, text: str, headers: Mapping[str, str]) -> None:
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        if not etag and not last_modified:
+            return
+        p = self._path(url)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp file per writer: concurrent crawls may store the same URL
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=p.parent, prefix=p.name, suffix=".tmp", delete=False
+        ) as f:
+            json.dump({"url": url, "etag": etag, "last_modified": last_modified, "text": text}, f)
+        try:
+            os.replace(f.name, p)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+
+    @staticmethod
+    def revalidation_headers(page: CachedPage) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
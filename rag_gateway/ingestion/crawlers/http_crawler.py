@@ -1,109 +1,312 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import functools
 import logging
 import re
-from typing import Deque, Dict, List, Optional, Set, Tuple
+from typing import AsyncIterator, Deque, Dict, FrozenSet, List, Optional, Set, Tuple
 from collections import deque
 from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
 
 import httpx
-from bs4 import BeautifulSoup
 
 from ...core.models import IngestDocument
-from ...core.text_processing import html_to_text, normalize_whitespace
+from ...core.text_processing import html_to_text, normalize_whitespace, parse_html
+from .http_cache import HTTPPageCache
 
 logger = logging.getLogger(__name__)
 
+def create_client(user_agent: Optional[str] = None) -> httpx.AsyncClient:
+    """
+    Build a pooled HTTP/2 crawler client.
+
+    Callers that own a whole crawl run (e.g. the ingest CLI) create one and
+    pass it down so every source reuses the same keep-alive connections;
+    they are responsible for closing it.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+        http2=True,
+        follow_redirects=True,
+        headers={"User-Agent": user_agent} if user_agent else None,
+    )
+
+
+class DomainRateLimiter:
+    """
+    Per-host politeness shared by every crawl that uses it.
+
+    Request starts to the same host are spaced at least min_delay_s apart,
+    while requests to different hosts never wait on each other, so many
+    sites can be crawled side by side. A longer Crawl-delay from a host's
+    robots.txt (see crawl_delay) takes precedence for that host.
+    """
+
+    def __init__(self, min_delay_s: float = 0.0, max_crawl_delay_s: float = 30.0):
+        self.min_delay_s = min_delay_s
+        self.max_crawl_delay_s = max_crawl_delay_s
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._last: Dict[str, float] = {}  # host -> last request start (event loop clock)
+        self._robots: Dict[str, asyncio.Task] = {}  # origin -> Crawl-delay lookup
+
+    async def crawl_delay(self, client: httpx.AsyncClient, url: str, user_agent: str, timeout: float = 10.0) -> float:
+        """
+        Return the delay to use for url's host: the larger of min_delay_s and
+        the robots.txt Crawl-delay for user_agent, capped at
+        max_crawl_delay_s. robots.txt is fetched once per origin and shared
+        by every crawl using this limiter.
+        """
+        origin = _origin(url)
+        task = self._robots.get(origin)
+        if task is None:
+            task = asyncio.create_task(self._robots_delay(client, origin, user_agent, timeout))
+            self._robots[origin] = task
+        robots_delay = await asyncio.shield(task)
+        return max(self.min_delay_s, robots_delay or 0.0)
+
+    async def _robots_delay(self, client: httpx.AsyncClient, origin: str, user_agent: str, timeout: float) -> Optional[float]:
+        delay = await _fetch_crawl_delay(client, origin, user_agent, timeout)
+        if delay is not None and delay > self.max_crawl_delay_s:
+            # A huge Crawl-delay would stall this host's workers, and the run, for hours
+            logger.warning(
+                f"robots.txt Crawl-delay of {delay}s for {origin} exceeds "
+                f"max_crawl_delay_s, using {self.max_crawl_delay_s}s"
+            )
+            return self.max_crawl_delay_s
+        return delay
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, host: str, min_delay_s: Optional[float] = None) -> AsyncIterator[None]:
+        """Wait out the residual delay for host, then run the request body."""
+        delay = self.min_delay_s if min_delay_s is None else min_delay_s
+        if delay > 0:
+            loop = asyncio.get_running_loop()
+            async with self._locks.setdefault(host, asyncio.Lock()):
+                dt = loop.time() - self._last.get(host, float("-inf"))
+                if dt < delay:
+                    await asyncio.sleep(delay - dt)
+                self._last[host] = loop.time()
+        yield
+
+
+async def _fetch_crawl_delay(client: httpx.AsyncClient, origin: str, user_agent: str, timeout: float) -> Optional[float]:
+    try:
+        r = await client.get(f"{origin}/robots.txt", headers={"User-Agent": user_agent}, timeout=httpx.Timeout(timeout))
+        if r.status_code != 200:
+            return None
+        rp = RobotFileParser()
+        rp.parse(r.text.splitlines())
+        rp.modified()  # crawl_delay() reports nothing until the parser is marked as read
+        delay = rp.crawl_delay(user_agent)
+    except Exception as e:
+        logger.debug(f"No robots.txt Crawl-delay for {origin}: {e}")
+        return None
+    if delay:
+        logger.info(f"Honouring robots.txt Crawl-delay of {delay}s for {origin}")
+    return float(delay) if delay else None
+
 
 async def crawl_urls_parallel(
+    client: httpx.AsyncClient,
     urls: List[str],
     max_concurrent: int = 8,
     max_total: int = 20,
     timeout: float = 30.0,
     user_agent: str = "rag-gateway/0.1",
-    continue_on_failure: bool = True
-) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    continue_on_failure: bool = True,
+    delay_s: float = 0.0,
+    rate_limiter: Optional[DomainRateLimiter] = None,
+    cache: Optional[HTTPPageCache] = None,
+) -> List[Tuple[str, Optional[str], Optional[str], List[str]]]:
     """
     Crawl multiple URLs concurrently with controlled parallelism.
 
     Args:
+        client: HTTP client to fetch with; owned (and closed) by the caller
         urls: List of URLs to crawl
         max_concurrent: Maximum concurrent requests (default: 8)
         max_total: Absolute maximum concurrent requests (default: 20)
         timeout: Request timeout in seconds
         user_agent: HTTP User-Agent header
         continue_on_failure: Continue processing despite individual failures
+        delay_s: Minimum gap between request starts to the same host
+        rate_limiter: Shared per-host limiter, to keep politeness across batches
+            and concurrent crawls; a private one using delay_s if omitted
+        cache: Optional page cache; cached pages are revalidated and reused on 304
 
     Returns:
-        List of (url, raw_html, plain_text) tuples, None for failed requests
+        List of (url, title, plain_text, links) tuples in input order;
+        title and plain_text are None and links empty for failed requests
     """
     # Validate and clamp concurrency limits
     max_concurrent = min(max_concurrent, max_total)
 
-    semaphore = asyncio.Semaphore(max_concurrent)
-    results = []
+    if rate_limiter is None:
+        rate_limiter = DomainRateLimiter(delay_s)
+    request_headers = {"User-Agent": user_agent}
 
-    async def fetch_single_url(url: str) -> Tuple[str, Optional[str], Optional[str]]:
-        async with semaphore:
-            try:
-                async with httpx.AsyncClient(
-                    timeout=httpx.Timeout(timeout),
-                    headers={"User-Agent": user_agent},
-                    follow_redirects=True
-                ) as client:
-                    logger.debug(f"Fetching: {url}")
-                    response = await client.get(url)
-                    response.raise_for_status()
-
-                    # Return both raw HTML (for link extraction) and plain text (for content)
-                    raw_html = response.text
-                    plain_text = html_to_text(raw_html)
-                    logger.debug(f"Completed: {url} ({len(plain_text)} chars)")
-                    return url, raw_html, plain_text
+    async def fetch_single_url(url: str) -> Tuple[str, Optional[str], Optional[str], List[str]]:
+        try:
+            cached = await asyncio.to_thread(cache.get, url) if cache else None
+            headers = request_headers
+            if cached is not None:
+                headers = {**request_headers, **HTTPPageCache.revalidation_headers(cached)}
+
+            logger.debug(f"Fetching: {url}")
+            # Per-host politeness: only requests to the same netloc are spaced
+            # out, so a multi-host crawl keeps all of its slots busy.
+            delay = await rate_limiter.crawl_delay(client, url, user_agent, timeout)
+            async with rate_limiter.acquire(urlparse(url).netloc, min_delay_s=delay):
+                response = await client.get(url, headers=headers, timeout=httpx.Timeout(timeout))
+
+            if cached is not None and response.status_code == 304:
+                logger.debug(f"Not modified, using cached copy: {url}")
+                raw_html = cached.text
+            else:
+                response.raise_for_status()
+                raw_html = response.text
+                if cache:
+                    try:
+                        await asyncio.to_thread(cache.put, url, raw_html, response.headers)
+                    except Exception as e:
+                        # The page was fetched fine; only the cache copy is lost
+                        logger.warning(f"Failed to cache {url}: {e}")
+            # Single parse for title, text and links, off the event loop
+            title, plain_text, links = await asyncio.to_thread(parse_page, url, raw_html)
+            logger.debug(f"Completed: {url} ({len(plain_text)} chars)")
+            return url, title, plain_text, links
 
-            except Exception as e:
-                logger.warning(f"Failed to fetch {url}: {e}")
-                if not continue_on_failure:
-                    raise
-                return url, None, None
+        except Exception as e:
+            logger.warning(f"Failed to fetch {url}: {e}")
+            if not continue_on_failure:
+                raise
+            return url, None, None, []
 
-    # Execute all requests concurrently
+    # Bounded worker pool: max_concurrent workers pull URLs from a queue, so
+    # concurrency is capped without holding one pending coroutine per URL.
     logger.info(f"Starting parallel fetch of {len(urls)} URLs (max_concurrent={max_concurrent})")
-    tasks = [fetch_single_url(url) for url in urls]
-    raw_results = await asyncio.gather(*tasks, return_exceptions=True)
+    queue: asyncio.Queue[Tuple[int, str]] = asyncio.Queue()
+    for item in enumerate(urls):
+        queue.put_nowait(item)
 
-    # Process results
-    for result in raw_results:
-        if isinstance(result, Exception):
-            if not continue_on_failure:
-                raise result
-            logger.error(f"Unexpected error in URL fetching: {result}")
-        else:
-            results.append(result)
+    slots: List[Optional[Tuple[str, Optional[str], Optional[str], List[str]]]] = [None] * len(urls)
+    errors: List[BaseException] = []
+
+    async def worker() -> None:
+        while True:
+            idx, url = await queue.get()
+            try:
+                slots[idx] = await fetch_single_url(url)
+            except Exception as e:
+                logger.error(f"Unexpected error in URL fetching: {e}")
+                errors.append(e)
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(max_concurrent, len(urls)))]
+    try:
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
 
-    successful = sum(1 for _, html, _ in results if html is not None)
+    if errors and not continue_on_failure:
+        raise errors[0]
+
+    # One entry per input URL, in input order, so callers can zip results
+    # with their URL metadata; a URL whose worker errored gets a failure entry
+    results = [r if r is not None else (url, None, None, []) for url, r in zip(urls, slots)]
+
+    successful = sum(1 for _, _, text, _ in results if text is not None)
     failed = len(results) - successful
 
     logger.info(f"Parallel fetch complete: {successful} successful, {failed} failed")
     return results
 
 
-def should_skip_url(url: str, allowed_domains: Set[str], allowed_prefixes: Optional[List[str]], exclude_patterns: Optional[List[str]]) -> bool:
+def parse_page(url: str, raw_html: str) -> Tuple[str, str, List[str]]:
+    """
+    Parse a page once and return (title, plain_text, links).
+
+    Title and absolute, fragment-free link targets are read from the tree
+    first; html_to_text then strips the same tree in place, so the HTML is
+    only parsed a single time.
+    """
+    soup = parse_html(raw_html)
+    title = soup.title.get_text() if soup.title is not None else ""
+
+    links: List[str] = []
+    for a in soup.find_all("a", href=True):
+        href = a.get("href")
+        if href and isinstance(href, str):
+            link = urljoin(url, href).split("#", 1)[0]
+            if link:
+                links.append(link)
+
+    plain_text = html_to_text(soup)
+    return normalize_whitespace(title)[:200] or url, plain_text, links
+
+
+def _origin(url: str) -> str:
+    """Return the scheme://netloc prefix of a URL without a full parse."""
+    start = url.find("://")
+    if start < 0:
+        return url
+    end = len(url)
+    for sep in "/?#":
+        i = url.find(sep, start + 3)
+        if 0 <= i < end:
+            end = i
+    return url[:end]
+
+
+@functools.lru_cache(maxsize=4096)
+def _origin_allowed(origin: str, allowed_domains: FrozenSet[str]) -> bool:
+    # Scheme and domain checks only depend on the origin, which is shared by
+    # almost every link on a site, so the decision is cached per origin.
     try:
-        u = urlparse(url)
+        u = urlparse(origin)
     except Exception:
-        return True
+        return False
     if u.scheme not in ("http", "https"):
-        return True
+        return False
     if u.netloc and u.netloc not in allowed_domains:
+        return False
+    return True
+
+
+def compile_exclude_patterns(patterns: Optional[List[str]]) -> Tuple[re.Pattern, ...]:
+    """
+    Union exclude patterns into one regex so a URL is scanned once, not once
+    per pattern. Patterns with inline global flags such as (?i) are only valid
+    at the start of a regex, so those are kept as separate regexes.
+    """
+    combinable: List[str] = []
+    separate: List[re.Pattern] = []
+    for p in patterns or ():
+        try:
+            re.compile(f"(?:{p})")
+        except re.error:
+            separate.append(re.compile(p))  # raises for genuinely invalid patterns
+        else:
+            combinable.append(p)
+    if combinable:
+        separate.insert(0, re.compile("|".join(f"(?:{p})" for p in combinable)))
+    return tuple(separate)
+
+
+def should_skip_url(url: str, allowed_domains: FrozenSet[str], allowed_prefixes: Tuple[str, ...], exclude_res: Tuple[re.Pattern, ...]) -> bool:
+    if not _origin_allowed(_origin(url), allowed_domains):
         return True
-    if allowed_prefixes and not any(url.startswith(p) for p in allowed_prefixes):
+    # str.startswith accepts a tuple and checks every prefix in C
+    if allowed_prefixes and not url.startswith(allowed_prefixes):
         return True
-    if exclude_patterns:
-        for pat in exclude_patterns:
-            if re.search(pat, url):
-                return True
+    for r in exclude_res:
+        if r.search(url):
+            return True
     return False
 
 
@@ -115,24 +318,50 @@ async def crawl_http_docs(
     timeout_s: int,
     delay_s: float,
     max_concurrent: int = 8,
+    cache: Optional[HTTPPageCache] = None,
+    rate_limiter: Optional[DomainRateLimiter] = None,
+    client: Optional[httpx.AsyncClient] = None,
 ) -> List[IngestDocument]:
     """
     Parallel breadth-first web crawler with link following.
 
     Uses batched parallel processing to achieve 8x performance improvement
     while maintaining BFS correctness through batched queue processing.
+    Without a client, one is created for this crawl and closed after it.
     """
-    allowed_domains = set(spec.allowed_domains or [])
-    allowed_prefixes = spec.allowed_url_prefixes or []
-    exclude_patterns = spec.exclude_url_patterns or []
+    if client is None:
+        async with create_client(user_agent) as own_client:
+            return await crawl_http_docs(
+                spec=spec,
+                user_agent=user_agent,
+                max_pages=max_pages,
+                max_depth=max_depth,
+                timeout_s=timeout_s,
+                delay_s=delay_s,
+                max_concurrent=max_concurrent,
+                cache=cache,
+                rate_limiter=rate_limiter,
+                client=own_client,
+            )
+
+    allowed_domains = frozenset(spec.allowed_domains or [])
+    allowed_prefixes = tuple(spec.allowed_url_prefixes or ())
+    exclude_res = compile_exclude_patterns(spec.exclude_url_patterns)
 
     max_pages = spec.max_pages or max_pages
     max_depth = spec.max_depth or max_depth
 
+    if rate_limiter is None:
+        rate_limiter = DomainRateLimiter(delay_s)
+
     # Tracking structures
     visited: Set[str] = set()
-    fetched_content: Dict[str, Tuple[str, str]] = {}  # url -> (raw_html, plain_text)
+    enqueued: Set[str] = set(spec.start_urls)  # every URL ever queued, to never queue it twice
+    fetched_content: Dict[str, Tuple[str, str]] = {}  # url -> (title, plain_text)
     queue: Deque[Tuple[str, int]] = deque([(u, 0) for u in spec.start_urls])
+    # Links found once the budget is spent, kept (up to max_pages) in case
+    # queued URLs fail and the budget frees up again
+    deferred: Deque[Tuple[str, int]] = deque()
     documents: List[IngestDocument] = []
 
     logger.info(f"Starting parallel HTTP crawl: max_pages={max_pages}, max_depth={max_depth}, max_concurrent={max_concurrent}")
@@ -149,7 +378,9 @@ async def crawl_http_docs(
             if not queue:
                 break
             url, depth = queue.popleft()
-            if url not in visited and should_skip_url(url, allowed_domains, allowed_prefixes, exclude_patterns):
+            if url in visited:
+                continue
+            if should_skip_url(url, allowed_domains, allowed_prefixes, exclude_res):
                 continue
             visited.add(url)
             batch_urls.append(url)
@@ -162,52 +393,59 @@ async def crawl_http_docs(
 
         # Fetch all URLs in this batch in parallel
         batch_results = await crawl_urls_parallel(
+            client=client,
             urls=batch_urls,
             max_concurrent=max_concurrent,
             timeout=timeout_s,
             user_agent=user_agent,
-            continue_on_failure=True
+            continue_on_failure=True,
+            delay_s=delay_s,
+            rate_limiter=rate_limiter,
+            cache=cache,
         )
 
-        # Process batch results and extract links for next level
+        # Process batch results and extract links for next level. The frontier
+        # only grows by what can still be accepted: accepted pages and queued
+        # URLs count against max_pages, while failed or too-short fetches do
+        # not, so their budget is freed again for the next batch.
         new_links: List[Tuple[str, int]] = []
+        budget = max_pages - len(fetched_content) - len(queue)
 
-        for (url, depth), (fetched_url, raw_html, plain_text) in zip(batch_metadata, batch_results):
+        for (url, depth), (fetched_url, title, plain_text, links) in zip(batch_metadata, batch_results):
             if plain_text and len(plain_text) >= 200:
-                # Store both raw HTML (for title extraction) and plain text (for content)
-                fetched_content[url] = (raw_html or "", plain_text)
-
-                # Extract links from raw HTML if within depth limit
-                if depth < max_depth and raw_html:
-                    try:
-                        soup = BeautifulSoup(raw_html, "lxml")
-                        for a in soup.find_all("a", href=True):
-                            href = a.get("href")
-                            if href and isinstance(href, str):
-                                link = urljoin(url, href).split("#", 1)[0]
-                                if link and link not in visited and len(fetched_content) + len(new_links) < max_pages:
-                                    new_links.append((link, depth + 1))
-                    except Exception as e:
-                        logger.debug(f"Failed to extract links from {url}: {e}")
-
-        # Add new links to queue
+                fetched_content[url] = (title or url, plain_text)
+                budget -= 1
+
+                # Follow links only within the depth limit
+                if depth >= max_depth:
+                    continue
+                for link in links:
+                    if budget <= 0 and len(deferred) >= max_pages:
+                        break
+                    if link in enqueued:
+                        continue
+                    enqueued.add(link)
+                    if should_skip_url(link, allowed_domains, allowed_prefixes, exclude_res):
+                        continue
+                    if budget > 0:
+                        new_links.append((link, depth + 1))
+                        budget -= 1
+                    else:
+                        deferred.append((link, depth + 1))
+
+        # Add new links to queue, then top it up from the overflow as failed
+        # or too-short fetches free budget again
         queue.extend(new_links)
+        room = max_pages - len(fetched_content) - len(queue)
+        while room > 0 and deferred:
+            queue.append(deferred.popleft())
+            room -= 1
 
         logger.debug(f"Batch complete: {len(batch_urls)} processed, {len(new_links)} new links discovered")
 
-        # Politeness delay between batches
-        if delay_s > 0 and queue:
-            await asyncio.sleep(delay_s)
-
     # Convert fetched content to documents
-    for url, (raw_html, plain_text) in fetched_content.items():
+    for url, (title, plain_text) in fetched_content.items():
         try:
-            # Extract title from raw HTML
-            title = url
-            title_match = re.search(r"<title>(.*?)</title>", raw_html, re.IGNORECASE | re.DOTALL)
-            if title_match:
-                title = normalize_whitespace(title_match.group(1))[:200] or url
-
             # Create document with plain text content
             doc = IngestDocument(
                 title=title,
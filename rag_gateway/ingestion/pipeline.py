@@ -1,17 +1,51 @@
 from __future__ import annotations
 
 import hashlib
-from typing import List, Optional
+from typing import Any, Callable, List, Optional
 
 from ..core.models import ChunkRecord, IngestDocument
 from ..core.chunking import chunk_text
-from ..core.text_processing import normalize_whitespace
+
+try:
+    from blake3 import blake3
+except ImportError:  # optional, only needed for id_hash="blake3"
+    blake3 = None
+
+
+ID_HASHES = ("sha256", "blake3")
 
 
 def sha256_hex(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8", errors="ignore")).hexdigest()
 
 
+def _hash_factory(id_hash: str) -> Callable[..., Any]:
+    """
+    Return the hasher constructor used for doc/chunk ids.
+
+    Ids are dedup keys, not security boundaries, so blake3 is a valid and much
+    faster choice. Changing the algorithm changes every id, so existing
+    collections must be re-ingested (e.g. after --reset) when switching.
+    """
+    if id_hash == "sha256":
+        return hashlib.sha256
+    if id_hash == "blake3":
+        if blake3 is None:
+            raise RuntimeError("id_hash 'blake3' requires the blake3 package (pip install blake3)")
+        return blake3
+    raise ValueError(f"Unsupported id_hash '{id_hash}', expected one of {ID_HASHES}")
+
+
+def count_chunks(doc: IngestDocument, max_chars: int, overlap_chars: int) -> int:
+    """
+    Number of chunks document_to_chunks would produce for doc.
+
+    Used by dry runs: chunk boundaries are paragraph/sentence aware, so the
+    text is still split, but no ids are hashed and no ChunkRecord is built.
+    """
+    return len(chunk_text(doc.text, max_chars=max_chars, overlap_chars=overlap_chars))
+
+
 def document_to_chunks(
     doc: IngestDocument,
     default_vendor: Optional[str],
@@ -20,21 +54,29 @@ def document_to_chunks(
     default_source_type: Optional[str],
     max_chars: int,
     overlap_chars: int,
+    id_hash: str = "sha256",
 ) -> List[ChunkRecord]:
-    doc_id = doc.doc_id or sha256_hex(f"{doc.url_or_path}|{doc.title}")[:24]
+    new_hash = _hash_factory(id_hash)
+    doc_id = doc.doc_id or new_hash(f"{doc.url_or_path}|{doc.title}".encode("utf-8", errors="ignore")).hexdigest()[:24]
 
     vendor = doc.vendor or default_vendor
     product = doc.product or default_product
     version = doc.version or default_version
     source_type = doc.source_type or (default_source_type or "official_docs")
 
+    # chunk_text already returns whitespace-normalized chunks
     chunks = chunk_text(doc.text, max_chars=max_chars, overlap_chars=overlap_chars)
 
+    # Chunk ids are H("{doc_id}|{i}|{chash}"); hash the shared doc_id prefix
+    # once and copy the hasher per chunk instead of re-hashing it every time.
+    id_prefix = new_hash(f"{doc_id}|".encode("utf-8", errors="ignore"))
+
     out: List[ChunkRecord] = []
     for i, ch in enumerate(chunks):
-        norm = normalize_whitespace(ch)
-        chash = sha256_hex(norm)
-        cid = sha256_hex(f"{doc_id}|{i}|{chash}")[:32]
+        chash = new_hash(ch.encode("utf-8", errors="ignore")).hexdigest()
+        h = id_prefix.copy()
+        h.update(f"{i}|{chash}".encode("ascii"))
+        cid = h.hexdigest()[:32]
         out.append(
             ChunkRecord(
                 chunk_id=cid,
@@ -46,7 +88,7 @@ def document_to_chunks(
                 vendor=vendor,
                 product=product,
                 version=version,
-                text=norm,
+                text=ch,
             )
         )
     return out
@@ -1,18 +1,33 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+from itertools import islice
 from typing import Dict, List, Optional, Tuple
 
-from qdrant_client.http import models as qm
+import httpx
+import numpy as np
+import orjson
 
 from ..storage.tei_client import TEIClient
 from ..storage.tantivy_index import TantivyBM25
 from ..storage.qdrant_store import QdrantVectorStore
 from ..core.models import IngestDocument, CrawlHTTP, CrawlGitHub
-from ..ingestion.pipeline import document_to_chunks
-from ..ingestion.crawlers.http_crawler import crawl_http_docs
+from ..ingestion.pipeline import count_chunks, document_to_chunks
+from ..ingestion.crawlers.http_crawler import DomainRateLimiter, crawl_http_docs, create_client
+from ..ingestion.crawlers.http_cache import HTTPPageCache
 from ..ingestion.crawlers.github_crawler import crawl_github_repo
 
+logger = logging.getLogger(__name__)
+
+
+# Field order for the Qdrant payload and Tantivy document built per chunk
+_PAYLOAD_KEYS = (
+    "chunk_id", "chunk_hash", "doc_id", "title", "source", "source_type",
+    "url_or_path", "vendor", "product", "version", "text",
+)
+_TANTIVY_KEYS = ("chunk_id", "title", "source", "url_or_path", "vendor", "product", "version", "text")
+
 
 async def batched_embed_many(
     tei_client,
@@ -25,7 +40,7 @@ async def batched_embed_many(
     timeout: int = 120,
     min_batch_size: int = 1,
     config: Optional[Dict] = None
-) -> List[List[float]]:
+) -> List[Optional[np.ndarray]]:
     """
     Embed texts in batches with parallel processing, adaptive sizing, and failure recovery.
 
@@ -42,14 +57,16 @@ async def batched_embed_many(
         config: Configuration dict for logging
 
     Returns:
-        List of embedding vectors (preserves input order)
+        List of float32 embedding vectors aligned with texts; None for texts
+        whose batch permanently failed
     """
     import asyncio
-    import json
     from pathlib import Path
     from datetime import datetime
 
     logger = logging.getLogger(__name__)
+    # More in flight than the client's pool would only queue inside httpx
+    max_concurrent = max(1, min(max_concurrent, getattr(tei_client, "max_connections", max_concurrent)))
     log_level = config.get("logging", {}).get("level", "INFO") if config else "INFO"
     embed_progress = config.get("logging", {}).get("embed_progress", True) if config else True
     embed_log_failures = config.get("tei", {}).get("embed_log_failures", True) if config else True
@@ -67,120 +84,123 @@ async def batched_embed_many(
     if embed_progress:
         logger.info(f"Starting batched embedding: {len(texts)} texts, {total_batches} batches, batch_size={batch_size}")
 
-    # Create batches with indices to preserve order
-    batches = []
-    for i in range(0, len(texts), batch_size):
-        batch_texts = texts[i:i + batch_size]
-        batch_idx = i // batch_size
-        batches.append((batch_idx, batch_texts))
-
     # Semaphore for concurrency control
     semaphore = asyncio.Semaphore(max_concurrent)
 
-    async def process_batch_adaptive(batch_idx: int, batch_texts: List[str], current_batch_size: int) -> Tuple[int, Optional[List[List[float]]]]:
+    async def process_batch_adaptive(batch_idx: int, batch_texts: List[str], current_batch_size: int) -> Tuple[int, Optional[np.ndarray]]:
         """Process a batch with adaptive sizing on failure."""
-        async with semaphore:
-            for attempt in range(max_retries + 1):
-                try:
-                    if embed_progress and attempt > 0:
-                        logger.info(f"Processing batch {batch_idx + 1}/{total_batches} (attempt {attempt + 1})")
-
-                    embed_task = asyncio.create_task(tei_client.embed_many(batch_texts))
-                    vectors = await asyncio.wait_for(embed_task, timeout=timeout)
-
-                    if embed_progress and logger.isEnabledFor(logging.DEBUG):
-                        logger.debug(f"Completed batch {batch_idx + 1}/{total_batches}")
-                    return batch_idx, vectors
-
-                except asyncio.TimeoutError:
-                    logger.warning(f"Batch {batch_idx + 1} timed out (attempt {attempt + 1})")
-                except Exception as e:
-                    error_str = str(e)
-                    if "413" in error_str and current_batch_size > min_batch_size:
-                        # Payload too large - break down into smaller batches
-                        logger.warning(f"Batch {batch_idx + 1} too large (size {current_batch_size}), splitting...")
-
-                        half_size = max(current_batch_size // 2, min_batch_size)
-                        mid_point = len(batch_texts) // 2
-
-                        # Recursively process smaller batches
-                        left_result = await process_batch_adaptive(batch_idx, batch_texts[:mid_point], half_size)
-                        right_result = await process_batch_adaptive(batch_idx, batch_texts[mid_point:], half_size)
-
-                        # Combine results (both should be successful if we get here)
-                        if left_result[1] is not None and right_result[1] is not None:
-                            combined_vectors = left_result[1] + right_result[1]
-                            return batch_idx, combined_vectors
-                        else:
-                            # One of the sub-batches failed, propagate failure
-                            return batch_idx, None
+        for attempt in range(max_retries + 1):
+            try:
+                if embed_progress and attempt > 0:
+                    logger.info(f"Processing batch {batch_idx + 1}/{total_batches} (attempt {attempt + 1})")
+
+                # Only the TEI call holds a slot: retry sleeps and 413 splits
+                # run outside it, so sub-batches never wait on their parent
+                async with semaphore:
+                    vectors = await asyncio.wait_for(tei_client.embed_many(batch_texts), timeout=timeout)
+
+                if embed_progress and logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Completed batch {batch_idx + 1}/{total_batches}")
+                return batch_idx, vectors
+
+            except asyncio.TimeoutError:
+                logger.warning(f"Batch {batch_idx + 1} timed out (attempt {attempt + 1})")
+            except Exception as e:
+                error_str = str(e)
+                if "413" in error_str and current_batch_size > min_batch_size:
+                    # Payload too large - break down into smaller batches
+                    logger.warning(f"Batch {batch_idx + 1} too large (size {current_batch_size}), splitting...")
+
+                    half_size = max(current_batch_size // 2, min_batch_size)
+                    mid_point = len(batch_texts) // 2
+
+                    # Recursively process smaller batches
+                    left_result = await process_batch_adaptive(batch_idx, batch_texts[:mid_point], half_size)
+                    right_result = await process_batch_adaptive(batch_idx, batch_texts[mid_point:], half_size)
+
+                    # Combine results (both should be successful if we get here)
+                    if left_result[1] is not None and right_result[1] is not None:
+                        combined_vectors = np.concatenate((left_result[1], right_result[1]))
+                        return batch_idx, combined_vectors
                     else:
-                        logger.warning(f"Batch {batch_idx + 1} failed (attempt {attempt + 1}): {e}")
-
-                if attempt < max_retries:
-                    delay = retry_delay * (backoff ** attempt)
-                    logger.info(f"Retrying batch {batch_idx + 1} in {delay:.1f}s")
-                    await asyncio.wait_for(asyncio.sleep(delay), timeout=delay + 1)
-
-            # All retries exhausted - log failure
-            failure_record = {
-                "timestamp": datetime.now().isoformat(),
-                "batch_index": batch_idx,
-                "batch_size": len(batch_texts),
-                "error_type": "PermanentFailure",
-                "error_message": f"Failed after {max_retries + 1} attempts",
-                "document_count": len(batch_texts),
-                "sample_texts": batch_texts[:3] if len(batch_texts) <= 3 else batch_texts[:3] + ["..."],
-                "text_lengths": [len(text) for text in batch_texts]
-            }
-
-            failed_batches.append(failure_record)
-
-            if failure_log_file and embed_log_failures:
-                try:
-                    with open(failure_log_file, 'a') as f:
-                        json.dump(failure_record, f)
-                        f.write('\n')
-                except Exception as log_error:
-                    logger.error(f"Failed to write failure log: {log_error}")
-
-            logger.error(f"Batch {batch_idx + 1} permanently failed after all attempts")
-            return batch_idx, None  # Signal permanent failure
-
-    # Process all batches in parallel
-    tasks = [process_batch_adaptive(idx, texts, batch_size) for idx, texts in batches]
-    raw_results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    # Process results
-    ordered_results: List[Optional[List[List[float]]]] = [None] * len(batches)
+                        # One of the sub-batches failed, propagate failure
+                        return batch_idx, None
+                else:
+                    logger.warning(f"Batch {batch_idx + 1} failed (attempt {attempt + 1}): {e}")
+
+            if attempt < max_retries:
+                delay = retry_delay * (backoff ** attempt)
+                logger.info(f"Retrying batch {batch_idx + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        # All retries exhausted - log failure
+        failure_record = {
+            "timestamp": datetime.now().isoformat(),
+            "batch_index": batch_idx,
+            "batch_size": len(batch_texts),
+            "error_type": "PermanentFailure",
+            "error_message": f"Failed after {max_retries + 1} attempts",
+            "document_count": len(batch_texts),
+            "sample_texts": batch_texts[:3] if len(batch_texts) <= 3 else batch_texts[:3] + ["..."],
+            "text_lengths": [len(text) for text in batch_texts]
+        }
+
+        # Written in one go after all batches finish, see _write_failure_log
+        failed_batches.append(failure_record)
+
+        logger.error(f"Batch {batch_idx + 1} permanently failed after all attempts")
+        return batch_idx, None  # Signal permanent failure
+
+    # Batches are sliced on demand and fed to max_concurrent workers through a
+    # bounded queue; each worker writes into its batch's slot to keep order.
+    ordered_results: List[Optional[np.ndarray]] = [None] * total_batches
+    batch_queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrent)
+    worker_count = max(1, min(max_concurrent, total_batches))
+
+    async def produce_batches() -> None:
+        for batch_idx, i in enumerate(range(0, len(texts), batch_size)):
+            await batch_queue.put((batch_idx, texts[i:i + batch_size]))
+        for _ in range(worker_count):
+            await batch_queue.put(None)
+
+    async def batch_worker() -> None:
+        while (item := await batch_queue.get()) is not None:
+            batch_idx, batch_texts = item
+            try:
+                _, ordered_results[batch_idx] = await process_batch_adaptive(batch_idx, batch_texts, batch_size)
+            except Exception as e:
+                logger.error(f"Unexpected error in batch processing: {e}")
+
+    await asyncio.gather(produce_batches(), *(batch_worker() for _ in range(worker_count)))
+
+    if failure_log_file and failed_batches:
+        # One buffered append for all failures, off the event loop
+        def _write_failure_log() -> None:
+            with open(failure_log_file, 'ab') as f:
+                f.write(b"".join(orjson.dumps(r) + b"\n" for r in failed_batches))
+
+        try:
+            await asyncio.to_thread(_write_failure_log)
+        except Exception as log_error:
+            logger.error(f"Failed to write failure log: {log_error}")
+
+    # Single pass into a preallocated list; a failed batch leaves None in
+    # its texts' positions so vectors stay aligned with the input.
+    final_vectors: List[Optional[np.ndarray]] = [None] * len(texts)
     successful_batches = 0
-
-    for result in raw_results:
-        if isinstance(result, Exception):
-            logger.error(f"Unexpected error in batch processing: {result}")
-            continue
-
-        batch_idx, vectors = result
-        if vectors is not None:
-            ordered_results[batch_idx] = vectors
-            successful_batches += 1
-        else:
-            ordered_results[batch_idx] = None  # Failed batch
-
-    # Flatten results while preserving order
-    final_vectors = []
-    failed_count = 0
     for batch_idx, vectors in enumerate(ordered_results):
         if vectors is None:
-            failed_count += 1
             logger.warning(f"Skipping failed batch {batch_idx + 1}")
-        else:
-            final_vectors.extend(vectors)
+            continue
+        start = batch_idx * batch_size
+        final_vectors[start:start + len(vectors)] = vectors
+        successful_batches += 1
 
     # Summary logging
     if embed_progress:
         if failed_batches:
-            logger.warning(f"Batched embedding completed: {len(final_vectors)} vectors from {successful_batches}/{total_batches} batches")
+            embedded = sum(1 for v in final_vectors if v is not None)
+            logger.warning(f"Batched embedding completed: {embedded} vectors from {successful_batches}/{total_batches} batches")
             logger.warning(f"{len(failed_batches)} batches permanently failed - details logged to {failure_log_file}")
         else:
             logger.info(f"Batched embedding completed: {len(final_vectors)} vectors from {total_batches} batches")
@@ -207,11 +227,15 @@ async def ingest_documents(
     embed_batch_size: int = 10,
     embed_max_concurrent: int = 4,
     embed_config: Optional[Dict] = None,
+    id_hash: str = "sha256",
+    embed_workers: int = 2,
+    keep_bm25_writer: bool = False,
 ) -> Dict[str, int]:
-    chunks = []
-    for doc in documents:
-        chunks.extend(
-            document_to_chunks(
+    # keep_bm25_writer=True commits the Tantivy documents but leaves bm25's
+    # writer open for the next call; the caller must bm25.flush() at the end.
+    def iter_chunks():
+        for doc in documents:
+            yield from document_to_chunks(
                 doc=doc,
                 default_vendor=default_vendor,
                 default_product=default_product,
@@ -219,87 +243,164 @@ async def ingest_documents(
                 default_source_type=default_source_type,
                 max_chars=max_chars,
                 overlap_chars=overlap_chars,
+                id_hash=id_hash,
             )
-        )
-
-    if not chunks:
-        return {"documents": len(documents), "chunks": 0, "points": 0, "skipped": 0, "updated": 0}
 
     if dry_run:
-        return {"documents": len(documents), "chunks": len(chunks), "points": 0, "skipped": 0, "updated": 0}
+        chunks = sum(count_chunks(d, max_chars=max_chars, overlap_chars=overlap_chars) for d in documents)
+        return {"documents": len(documents), "chunks": chunks, "points": 0, "skipped": 0, "updated": 0}
 
+    chunk_count = 0
     skipped = 0
     updated = 0
-    to_process = []
-
-    if incremental:
-        for i in range(0, len(chunks), 256):
-            batch_ids = [c.chunk_id for c in chunks[i : i + 256]]
-            existing = qdrant.get_payloads(batch_ids)
-            for c in chunks[i : i + 256]:
-                if skip_unchanged:
-                    payload = existing.get(c.chunk_id)
-                    if payload and payload.get("chunk_hash") == c.chunk_hash:
-                        skipped += 1
-                        continue
-                to_process.append(c)
-    else:
-        to_process = chunks
-
-    if not to_process:
-        return {"documents": len(documents), "chunks": len(chunks), "points": 0, "skipped": skipped, "updated": 0}
 
+    # Three-stage pipeline so TEI embedding overlaps with Qdrant/Tantivy
+    # writes: a producer streams chunks and queues batches, embed workers
+    # turn them into vectors, and a single writer upserts them. Total TEI
+    # concurrency stays at embed_max_concurrent, split across the embed
+    # workers. Only a few lookup windows are held in memory at a time.
+    embed_workers = max(1, embed_workers)
+    worker_concurrency = max(1, embed_max_concurrent // embed_workers)
+    embed_queue: asyncio.Queue = asyncio.Queue(maxsize=embed_workers * 2)
+    upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=embed_workers * 2)
+    running_workers = embed_workers
     total_points = 0
-    for i in range(0, len(to_process), batch_size):
-        batch = to_process[i : i + batch_size]
-        vectors = await batched_embed_many(
-            tei_client=tei,
-            texts=[c.text for c in batch],
-            batch_size=embed_batch_size,
-            max_concurrent=embed_max_concurrent,
-            config=embed_config,
-        )
 
-        points: List[qm.PointStruct] = []
-        tantivy_docs = []
-
-        for c, v in zip(batch, vectors):
-            payload = {
-                "chunk_id": c.chunk_id,
-                "chunk_hash": c.chunk_hash,
-                "doc_id": c.doc_id,
-                "title": c.title,
-                "source": c.source_type,
-                "source_type": c.source_type,
-                "url_or_path": c.url_or_path,
-                "vendor": c.vendor or "",
-                "product": c.product or "",
-                "version": c.version or "",
-                "text": c.text,
-            }
-            points.append(qm.PointStruct(id=c.chunk_id, vector=v, payload=payload))
-            tantivy_docs.append(
-                {
-                    "chunk_id": c.chunk_id,
-                    "title": c.title,
-                    "source": c.source_type,
-                    "url_or_path": c.url_or_path,
-                    "vendor": c.vendor or "",
-                    "product": c.product or "",
-                    "version": c.version or "",
-                    "text": c.text,
-                }
+    # Existing chunks are looked up in 256-id windows, several in flight at
+    # once (capped to stay within Qdrant's connection limits).
+    window_size = 256
+    windows_in_flight = 8
+
+    async def produce() -> None:
+        nonlocal chunk_count, skipped
+        survivors: List = []
+        texts: List[str] = []  # text column of survivors, sliced per batch
+        stream = iter_chunks()
+        while group := list(islice(stream, window_size * windows_in_flight)):
+            chunk_count += len(group)
+            if incremental and skip_unchanged:
+                existing: Dict[str, str] = {}
+                async for pid, payload in qdrant.iter_payloads(
+                    [c.chunk_id for c in group],
+                    fields=["chunk_hash"],
+                    batch_size=window_size,
+                    max_in_flight=windows_in_flight,
+                ):
+                    existing[pid] = payload.get("chunk_hash", "")
+                # Unchanged text means an unchanged chunk_hash: skip embed and upsert
+                fresh = [c for c in group if existing.get(c.chunk_id) != c.chunk_hash]
+                skipped += len(group) - len(fresh)
+            else:
+                fresh = group
+            survivors.extend(fresh)
+            texts.extend([c.text for c in fresh])
+
+            full = len(survivors) - len(survivors) % batch_size
+            for i in range(0, full, batch_size):
+                await embed_queue.put((survivors[i : i + batch_size], texts[i : i + batch_size]))
+            survivors = survivors[full:]
+            texts = texts[full:]
+        if survivors:
+            await embed_queue.put((survivors, texts))
+        for _ in range(embed_workers):
+            await embed_queue.put(None)
+
+    async def embed_worker() -> None:
+        nonlocal running_workers
+        while (item := await embed_queue.get()) is not None:
+            batch, batch_texts = item
+            vectors = await batched_embed_many(
+                tei_client=tei,
+                texts=batch_texts,
+                batch_size=embed_batch_size,
+                max_concurrent=worker_concurrency,
+                config=embed_config,
             )
+            await upsert_queue.put((batch, vectors))
+        running_workers -= 1
+        if running_workers == 0:
+            await upsert_queue.put(None)
+
+    async def write() -> None:
+        nonlocal total_points
+        # Double-buffered: batch N+1's points are built while batch N is
+        # still being written, and Qdrant/Tantivy writes run side by side.
+        pending: Optional[asyncio.Future] = None
+        last: Optional[Tuple[List[str], np.ndarray, List[Dict]]] = None
+        while (item := await upsert_queue.get()) is not None:
+            batch, vectors = item
+            ids: List[str] = []
+            rows: List[np.ndarray] = []
+            payloads: List[Dict] = []
+            tantivy_docs = []
+
+            for c, v in zip(batch, vectors):
+                if v is None:
+                    continue  # Embedding failed; already logged
+                vendor, product, version = c.vendor or "", c.product or "", c.version or ""
+                ids.append(c.chunk_id)
+                rows.append(v)
+                payloads.append(
+                    dict(zip(_PAYLOAD_KEYS, (
+                        c.chunk_id, c.chunk_hash, c.doc_id, c.title, c.source_type, c.source_type,
+                        c.url_or_path, vendor, product, version, c.text,
+                    )))
+                )
+                tantivy_docs.append(
+                    dict(zip(_TANTIVY_KEYS, (
+                        c.chunk_id, c.title, c.source_type, c.url_or_path, vendor, product, version, c.text,
+                    )))
+                )
 
-        qdrant.upsert_points(points)
-        bm25.upsert_chunks(tantivy_docs)
-
-        total_points += len(points)
-        updated += len(points)
+            if not ids:
+                continue
+            last = (ids, np.stack(rows), payloads)
+            if pending is not None:
+                await pending
+            # The blocking Tantivy writer runs in a thread so embedding keeps
+            # going. Qdrant batches are not waited on; see the final upsert.
+            pending = asyncio.gather(
+                qdrant.upsert_batch(*last, wait=False),
+                asyncio.to_thread(bm25.add_chunks, tantivy_docs),
+            )
+            total_points += len(ids)
+
+        if pending is not None:
+            await pending
+            # Re-send the last batch with wait=True: Qdrant applies updates
+            # in order, so once it returns every earlier batch is indexed too.
+            await qdrant.upsert_batch(*last, wait=True)
+
+    failed = False
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(produce())
+            for _ in range(embed_workers):
+                tg.create_task(embed_worker())
+            tg.create_task(write())
+    except ExceptionGroup as eg:
+        failed = True
+        # Surface the original error to callers rather than the group wrapper
+        raise eg.exceptions[0]
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        # One Tantivy commit for the whole source instead of one per batch,
+        # also when ingest fails: skip_unchanged only checks Qdrant, so any
+        # chunk already upserted there must reach BM25 too.
+        try:
+            await asyncio.to_thread(bm25.commit if keep_bm25_writer else bm25.flush)
+        except Exception as e:
+            if not failed:
+                raise
+            logger.error(f"Tantivy commit failed after ingest error: {e}")
+
+    updated = total_points
 
     return {
         "documents": len(documents),
-        "chunks": len(chunks),
+        "chunks": chunk_count,
         "points": total_points,
         "skipped": skipped,
         "updated": updated,
@@ -318,31 +419,52 @@ async def crawl_sources(
     http_max_concurrent: int,
     github_max_files: int,
     github_max_file_size_bytes: int,
+    http_cache_dir: Optional[str] = None,
+    http_max_crawl_delay_s: float = 30.0,
+    rate_limiter: Optional[DomainRateLimiter] = None,
+    http_client: Optional[httpx.AsyncClient] = None,
 ) -> List[IngestDocument]:
-    docs: List[IngestDocument] = []
-
-    if http_specs:
-        for h in http_specs:
-            docs.extend(
-                await crawl_http_docs(
-                    spec=h,
-                    user_agent=http_user_agent,
-                    max_pages=http_max_pages,
-                    max_depth=http_max_depth,
-                    timeout_s=http_timeout_s,
-                    delay_s=http_delay_s,
-                    max_concurrent=http_max_concurrent,
-                )
-            )
-
-    if github_specs:
-        for g in github_specs:
-            docs.extend(
-                crawl_github_repo(
-                    spec=g,
-                    max_files=github_max_files,
-                    max_file_size_bytes=github_max_file_size_bytes,
-                )
-            )
+    # All specs are crawled concurrently; politeness is per host through the
+    # shared rate limiter, and git clones run in threads. Passing http_client
+    # lets callers reuse one connection pool across calls; otherwise one is
+    # created for this call's specs and closed when they finish.
+    cache = HTTPPageCache(http_cache_dir) if http_specs and http_cache_dir else None
+    if rate_limiter is None:
+        rate_limiter = DomainRateLimiter(http_delay_s, max_crawl_delay_s=http_max_crawl_delay_s)
+    own_client = http_client is None and bool(http_specs)
+    if own_client:
+        http_client = create_client(http_user_agent)
+
+    crawls = [
+        crawl_http_docs(
+            spec=h,
+            user_agent=http_user_agent,
+            max_pages=http_max_pages,
+            max_depth=http_max_depth,
+            timeout_s=http_timeout_s,
+            delay_s=http_delay_s,
+            max_concurrent=http_max_concurrent,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            client=http_client,
+        )
+        for h in http_specs or []
+    ]
+    crawls += [
+        asyncio.to_thread(
+            crawl_github_repo,
+            spec=g,
+            max_files=github_max_files,
+            max_file_size_bytes=github_max_file_size_bytes,
+        )
+        for g in github_specs or []
+    ]
 
+    docs: List[IngestDocument] = []
+    try:
+        for spec_docs in await asyncio.gather(*crawls):
+            docs.extend(spec_docs)
+    finally:
+        if own_client:
+            await http_client.aclose()
     return docs
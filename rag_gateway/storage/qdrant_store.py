@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import logging
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, FrozenSet, List, Optional, Sequence, Tuple
 
-from qdrant_client import QdrantClient
+import numpy as np
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models as qm
 
 
@@ -15,47 +18,108 @@ class QdrantHit:
     payload: Dict[str, Any]
 
 
+@functools.lru_cache(maxsize=1024)
+def _build_filter(items: FrozenSet[Tuple[str, Any]]) -> Optional[qm.Filter]:
+    # Gateway queries repeat the same vendor/product filters, so the Filter
+    # object is built once per distinct set and reused.
+    if not items:
+        return None
+    return qm.Filter(must=[qm.FieldCondition(key=k, match=qm.MatchValue(value=v)) for k, v in sorted(items)])
+
+
 class QdrantVectorStore:
     def __init__(self, url: str, collection: str, vector_size: int, distance: qm.Distance = qm.Distance.COSINE):
-        self.client = QdrantClient(url=url)
+        self.client = AsyncQdrantClient(url=url)
         self.collection = collection
         self.vector_size = vector_size
         self.distance = distance
+        self._ensured = False
 
-    def ensure_collection(self) -> None:
-        existing = [c.name for c in self.client.get_collections().collections]
-        if self.collection not in existing:
-            self.client.create_collection(
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def ensure_collection(self) -> None:
+        # Checked once per process; later calls cost no round trip
+        if self._ensured:
+            return
+        if not await self.client.collection_exists(self.collection):
+            await self.client.create_collection(
                 collection_name=self.collection,
                 vectors_config=qm.VectorParams(size=self.vector_size, distance=self.distance),
             )
             for field in ["vendor", "product", "version", "source_type", "doc_id", "chunk_id"]:
                 try:
-                    self.client.create_payload_index(
+                    await self.client.create_payload_index(
                         collection_name=self.collection,
                         field_name=field,
                         field_schema=qm.PayloadSchemaType.KEYWORD,
                     )
                 except Exception as e:
                     logging.warning(f"Failed to create payload index for {field}: {e}")
-                    pass
+        self._ensured = True
+
+    async def iter_payloads(
+        self,
+        ids: Sequence[str],
+        fields: Optional[List[str]] = None,
+        batch_size: int = 256,
+        max_in_flight: int = 8,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yield (id, payload) for each id already stored.
+
+        Ids are retrieved in batch_size groups, up to max_in_flight requests at
+        once, and results are yielded as each request completes (so not in
+        input order). Pass fields to fetch only those payload keys.
+        """
+        with_payload = fields if fields is not None else True
 
-    def get_payloads(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
-        res = self.client.retrieve(
+        async def fetch(batch: Sequence[str]) -> List[qm.Record]:
+            return await self.client.retrieve(
+                collection_name=self.collection,
+                ids=list(batch),
+                with_payload=with_payload,
+                with_vectors=False,
+            )
+
+        step = batch_size * max_in_flight
+        for start in range(0, len(ids), step):
+            window = ids[start : start + step]
+            tasks = [asyncio.create_task(fetch(window[i : i + batch_size])) for i in range(0, len(window), batch_size)]
+            try:
+                for done in asyncio.as_completed(tasks):
+                    for p in await done:
+                        yield str(p.id), p.payload or {}
+            finally:
+                # On an error or an early stop, cancel the sibling requests and
+                # collect every outcome so none is left unretrieved
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def upsert_batch(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        payloads: List[Dict[str, Any]],
+        wait: bool = True,
+    ) -> None:
+        """
+        Upsert columnar points: ids[i] gets row vectors[i] and payloads[i].
+
+        Sent as a single qm.Batch, so no PointStruct is built per row and the
+        whole vector matrix is converted with one tolist() call (the client
+        does not accept numpy arrays directly).
+        """
+        # wait=False returns once Qdrant has accepted the batch, without
+        # waiting for it to be applied; updates are still applied in order.
+        await self.client.upsert(
             collection_name=self.collection,
-            ids=ids,
-            with_payload=True,
-            with_vectors=False,
+            points=qm.Batch(ids=ids, vectors=vectors.tolist(), payloads=payloads),
+            wait=wait,
         )
-        out: Dict[str, Dict[str, Any]] = {}
-        for p in res:
-            out[str(p.id)] = p.payload or {}
-        return out
-
-    def upsert_points(self, points: List[qm.PointStruct]) -> None:
-        self.client.upsert(collection_name=self.collection, points=points)
 
-    def search(
+    async def search(
         self,
         vector: List[float],
         top_n: int,
@@ -63,15 +127,9 @@ class QdrantVectorStore:
     ) -> List[QdrantHit]:
         qfilter = None
         if filters:
-            must = []
-            for k, v in filters.items():
-                if v is None:
-                    continue
-                must.append(qm.FieldCondition(key=k, match=qm.MatchValue(value=v)))
-            if must:
-                qfilter = qm.Filter(must=must)
-
-        res = self.client.query_points(
+            qfilter = _build_filter(frozenset((k, v) for k, v in filters.items() if v is not None))
+
+        res = await self.client.query_points(
             collection_name=self.collection,
             query=vector,
             limit=top_n,
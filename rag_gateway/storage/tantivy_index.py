@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import re
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import tantivy
 
@@ -26,6 +27,11 @@ def escape_query(query: str) -> str:
     return _TANTIVY_SPECIAL_CHARS.sub(r'\\\1', query)
 
 
+# Fields BM25 queries run against, and the metadata fields stored per chunk
+_SEARCH_FIELDS = ["text"]
+_STORED_FIELDS = ("chunk_id", "title", "source", "url_or_path", "vendor", "product", "version")
+
+
 @dataclass
 class TantivyHit:
     chunk_id: str
@@ -34,8 +40,10 @@ class TantivyHit:
 
 
 class TantivyBM25:
-    def __init__(self, index_dir: str):
+    def __init__(self, index_dir: str, writer_heap_bytes: int = 512_000_000):
         self.index_dir = Path(index_dir)
+        # A larger writer heap means fewer, bigger segments and so fewer merges
+        self.writer_heap_bytes = writer_heap_bytes
         self.index_dir.mkdir(parents=True, exist_ok=True)
 
         if (self.index_dir / "meta.json").exists():
@@ -44,44 +52,79 @@ class TantivyBM25:
         else:
             sb = tantivy.SchemaBuilder()
             sb.add_text_field("text", stored=False)
-            sb.add_text_field("chunk_id", stored=True)
-            sb.add_text_field("title", stored=True)
-            sb.add_text_field("source", stored=True)
-            sb.add_text_field("url_or_path", stored=True)
-            sb.add_text_field("vendor", stored=True)
-            sb.add_text_field("product", stored=True)
-            sb.add_text_field("version", stored=True)
+            for f in _STORED_FIELDS:
+                sb.add_text_field(f, stored=True)
             self.schema = sb.build()
             self.index = tantivy.Index(self.schema, path=str(self.index_dir))
 
-        self.searcher = self.index.searcher()
-
-    def refresh_searcher(self) -> None:
-        self.searcher = self.index.searcher()
+        # Readers pick up commits (also from the crawler process) on their own,
+        # so every search can take a fresh searcher instead of sharing one.
+        self.index.config_reader(reload_policy="OnCommit")
+        # Writer is created on first add and kept until flush(); commit()
+        # publishes staged documents but keeps it open for the next batch
+        self._writer: Optional[tantivy.IndexWriter] = None
+        self._writer_lock = threading.Lock()
+
+    def add_chunks(self, chunks: List[Dict[str, Any]]) -> None:
+        """
+        Stage chunks in the open writer, replacing any documents with the
+        same chunk_id. Nothing is visible to searches until commit() or flush().
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self.index.writer(heap_size=self.writer_heap_bytes)
+            writer = self._writer
+            # Deletes only hit documents added before them, so the batch's
+            # old versions are dropped first and the new ones added after.
+            for ch in chunks:
+                writer.delete_documents_by_term("chunk_id", ch["chunk_id"])
+            add_document = writer.add_document
+            for ch in chunks:
+                doc = tantivy.Document()
+                add_text = doc.add_text
+                add_text("text", ch["text"])
+                for f in _STORED_FIELDS:
+                    add_text(f, ch.get(f) or "")
+                add_document(doc)
+
+    def commit(self) -> None:
+        """
+        Commit everything staged by add_chunks and make it searchable, keeping
+        the writer (and its heap) open for further adds.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                return
+            self._writer.commit()
+        self.index.reload()
+
+    def flush(self) -> None:
+        """Commit everything staged by add_chunks, make it searchable and close the writer."""
+        with self._writer_lock:
+            if self._writer is None:
+                return
+            self._writer.commit()
+            self._writer.wait_merging_threads()
+            self._writer = None
+        # OnCommit reloads are asynchronous; reload now so this process sees
+        # the commit immediately
+        self.index.reload()
 
     def upsert_chunks(self, chunks: List[Dict[str, Any]]) -> None:
-        writer = self.index.writer()
-        for ch in chunks:
-            cid = ch["chunk_id"]
-            writer.delete_documents("chunk_id", cid)
-
-            doc = tantivy.Document()
-            doc.add_text("text", ch["text"])
-            for f in ["chunk_id", "title", "source", "url_or_path", "vendor", "product", "version"]:
-                doc.add_text(f, ch.get(f, "") or "")
-            writer.add_document(doc)
-        writer.commit()
-        self.searcher = self.index.searcher()
+        self.add_chunks(chunks)
+        self.flush()
 
     def search(self, query: str, top_n: int) -> List[TantivyHit]:
         # Escape special characters to prevent query syntax errors
         # when user input contains JSON, code snippets, or special chars
         escaped_query = escape_query(query)
-        q = self.index.parse_query(escaped_query, ["text"])
-        results = self.searcher.search(q, top_n)
+        q = self.index.parse_query(escaped_query, _SEARCH_FIELDS)
+        # One searcher per query keeps a consistent segment set for it
+        searcher = self.index.searcher()
+        results = searcher.search(q, top_n)
         hits: List[TantivyHit] = []
         for score, addr in results.hits:
-            doc = self.searcher.doc(addr)
+            doc = searcher.doc(addr)
             stored = doc.to_dict()
             chunk_id = (stored.get("chunk_id") or [""])[0]
             hits.append(TantivyHit(chunk_id=chunk_id, score=float(score), stored=stored))
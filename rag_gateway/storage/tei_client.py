@@ -1,34 +1,110 @@
 from __future__ import annotations
 
-from typing import List
+import asyncio
+from typing import List, Optional
+
 import httpx
+import numpy as np
+import orjson
 
 
 class TEIClient:
-    def __init__(self, embed_base_url: str, rerank_base_url: str, embed_model: str, rerank_model: str):
+    def __init__(
+        self,
+        embed_base_url: str,
+        rerank_base_url: str,
+        embed_model: str,
+        rerank_model: str,
+        max_connections: int = 8,
+    ):
         self.embed_base_url = embed_base_url.rstrip("/")
         self.rerank_base_url = rerank_base_url.rstrip("/")
         self.embed_model = embed_model
         self.rerank_model = rerank_model
+        # One pooled client for every embed/rerank call; callers fanning out
+        # requests should cap their concurrency at max_connections.
+        self.max_connections = max_connections
+        self._client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "TEIClient":
+        return self
 
-    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Embed texts; returns a (len(texts), dim) float32 array in input order."""
         url = f"{self.embed_base_url}/v1/embeddings"
         payload = {"model": self.embed_model, "input": texts}
-        async with httpx.AsyncClient(timeout=120) as client:
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            data = r.json()["data"]
-            data_sorted = sorted(data, key=lambda x: x.get("index", 0))
-            return [d["embedding"] for d in data_sorted]
-
-    async def embed_one(self, text: str) -> List[float]:
+        r = await self._client.post(url, json=payload, timeout=120)
+        r.raise_for_status()
+        data = orjson.loads(r.content)["data"]
+        # Place each embedding at its index: O(N), no sort. Entries without
+        # an index keep their response position.
+        out: List[List[float]] = [None] * len(data)
+        for i, d in enumerate(data):
+            out[d.get("index", i)] = d["embedding"]
+        return np.asarray(out, dtype=np.float32)
+
+    async def embed_many_batched(self, texts: List[str], batch_size: int = 32, max_concurrency: int = 4) -> np.ndarray:
+        """
+        Embed texts as sub-batches of batch_size with up to max_concurrency
+        requests in flight (never more than the pool allows). Output order
+        matches texts.
+        """
+        if len(texts) <= batch_size:
+            return await self.embed_many(texts)
+
+        slots = asyncio.Semaphore(max(1, min(max_concurrency, self.max_connections)))
+
+        async def embed_slice(i: int) -> np.ndarray:
+            async with slots:
+                return await self.embed_many(texts[i : i + batch_size])
+
+        batches = await asyncio.gather(*(embed_slice(i) for i in range(0, len(texts), batch_size)))
+        return np.concatenate(batches)
+
+    async def embed_one(self, text: str) -> np.ndarray:
         return (await self.embed_many([text]))[0]
 
-    async def rerank(self, query: str, texts: List[str]) -> dict:
+    async def rerank(self, query: str, texts: List[str], batch_size: Optional[int] = None) -> dict:
+        """
+        Score texts against query. With batch_size, the texts are sent as
+        parallel sub-batches and the results merged with their indices
+        shifted back to positions in texts.
+        """
+        if not batch_size or len(texts) <= batch_size:
+            return await self._rerank_batch(query, texts)
+
+        starts = range(0, len(texts), batch_size)
+        responses = await asyncio.gather(*(self._rerank_batch(query, texts[i : i + batch_size]) for i in starts))
+        return {"results": [item for i, rj in zip(starts, responses) for item in _offset_results(rj, i)]}
+
+    async def _rerank_batch(self, query: str, texts: List[str]) -> dict:
         url = f"{self.rerank_base_url}/rerank"
-        payload = {"model": self.rerank_model, "query": query, "texts": texts, "raw_scores": False}
-        async with httpx.AsyncClient(timeout=180) as client:
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            return r.json()
+        payload = {"model": self.rerank_model, "query": query, "texts": texts, "raw_scores": False, "return_text": False}
+        r = await self._client.post(url, json=payload, timeout=180)
+        if r.status_code == 413 and len(texts) > 1:
+            # Payload too large - score the halves separately
+            mid = len(texts) // 2
+            left, right = await asyncio.gather(
+                self._rerank_batch(query, texts[:mid]),
+                self._rerank_batch(query, texts[mid:]),
+            )
+            return {"results": _offset_results(left, 0) + _offset_results(right, mid)}
+        r.raise_for_status()
+        return orjson.loads(r.content)
+
 
+def _offset_results(rerank_json, offset: int) -> List[dict]:
+    # TEI answers with either a bare list or {"results": [...]}
+    items = rerank_json if isinstance(rerank_json, list) else rerank_json.get("results", [])
+    for item in items:
+        item["index"] = item.get("index", 0) + offset
+    return items
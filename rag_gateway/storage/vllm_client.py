@@ -1,25 +1,37 @@
 from __future__ import annotations
 
 import httpx
+import orjson
 from typing import Any, Dict
 
 
 class VLLMClient:
     def __init__(self, base_url: str):
         self.base_url = base_url.rstrip("/")
+        # One pooled client shared by all requests to keep connections alive
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "VLLMClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
 
     async def stream_chat_completions(self, payload: Dict[str, Any]):
         url = f"{self.base_url}/v1/chat/completions"
-        async with httpx.AsyncClient(timeout=None) as client:
-            async with client.stream("POST", url, json=payload) as r:
-                r.raise_for_status()
-                async for chunk in r.aiter_bytes():
-                    yield chunk
+        async with self._client.stream("POST", url, json=payload, timeout=None) as r:
+            r.raise_for_status()
+            async for chunk in r.aiter_bytes():
+                yield chunk
 
     async def chat_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         url = f"{self.base_url}/v1/chat/completions"
-        async with httpx.AsyncClient(timeout=300) as client:
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            return r.json()
+        r = await self._client.post(url, json=payload, timeout=300)
+        r.raise_for_status()
+        return orjson.loads(r.content)
 